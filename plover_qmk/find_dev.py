@@ -3,12 +3,21 @@ import select
 import time
 import os
 
+from collections import OrderedDict
+
 from plover import log
 
 from . import hiddev
 
 ctx = pyudev.Context()
 
+# when a hub or dock resets, udev fires a whole burst of add and remove events
+# at us. instead of probing every single one of them, we wait until things have
+# been quiet for this many seconds, and only then look at what's left.
+COALESCE_WINDOW = 0.2
+# ... but we don't wait forever if the events just keep coming
+COALESCE_MAX_WAIT = 2.0
+
 # TODO: make all lookups get()s, because apparently these attributes can disappear sometimes
 
 def check_device(device):
@@ -93,7 +102,65 @@ def find_devices():
     # we've found nothing...
     return None
 
-def wait_for_device(finished_notify_fd):
+def coalesce(events):
+    """Takes a sequence of (action, devpath, device) tuples and returns the
+    devices that are still around once all of them have happened. Events are
+    deduplicated by DEVPATH, and a remove cancels any pending add for the same
+    DEVPATH. The devices come out in the order of their surviving add: a duplicate
+    add keeps the device's place, but a device that was removed and then added
+    again goes to the end.
+    """
+
+    pending = OrderedDict()
+
+    for action, devpath, device in events:
+        if action == "add":
+            # a later add for the same DEVPATH replaces the earlier one
+            pending[devpath] = device
+        elif action == "remove":
+            # this cancels out an add we've seen before
+            pending.pop(devpath, None)
+
+    return list(pending.values())
+
+def coalesce_events(monitor, finished_notify_fd, window=COALESCE_WINDOW, max_wait=COALESCE_MAX_WAIT):
+    """Collects udev events from the monitor until no new event has arrived for
+    `window` seconds (or `max_wait` seconds have passed in total), and coalesces
+    them (see `coalesce`). Returns the devices that were added and are still
+    around, or None if we got the finished notification.
+    """
+
+    events = []
+    deadline = time.monotonic() + max_wait
+
+    while True:
+        timeout = min(window, deadline - time.monotonic())
+        if timeout <= 0:
+            break
+
+        ready, a, b = select.select([monitor, finished_notify_fd], [], [], timeout)
+
+        if finished_notify_fd in ready:
+            return None
+
+        if not ready:
+            # the window passed without anything new happening
+            break
+
+        device = monitor.poll(timeout=0)
+        if not device:
+            continue
+
+        # check if the subsystem is actually correct
+        if device.get("SUBSYSTEM") != "usbmisc":
+            continue
+
+        log.debug("device action for {} was \"{}\"".format(device.device_path, device.action))
+        events.append((device.action, device.device_path, device))
+
+    return coalesce(events)
+
+def wait_for_device(finished_notify_fd, window=COALESCE_WINDOW, max_wait=COALESCE_MAX_WAIT):
 
     # start the monitor _before doing the initial scan,
     # so we can't accidentally miss the event
@@ -114,26 +181,22 @@ def wait_for_device(finished_notify_fd):
         if finished_notify_fd in ready:
             return None
 
-        # there's definitely something in here now
-        device = monitor.poll()
-        if not device:
-            continue
+        # there's definitely something in here now. collect it together with
+        # whatever else comes in right after, so we don't probe devices that
+        # are about to disappear again.
+        log.debug("got device events, waiting for things to settle")
+        devices = coalesce_events(monitor, finished_notify_fd, window=window, max_wait=max_wait)
 
-        log.debug("found a new device")
-
-        # check if the subsystem is actually correct
-        if device["SUBSYSTEM"] != "usbmisc":
-            continue
+        if devices is None:
+            return None
 
-        # check if the device was plugged in
-        log.debug("device action was \"{}\"".format(device.action))
-        if device.action != "add":
-            continue
+        log.debug("{} device(s) left after coalescing".format(len(devices)))
 
-        # check if this is a stenoHID interface
-        device_fd = check_device(device)
-        if device_fd:
-            return device_fd
+        for device in devices:
+            # check if this is a stenoHID interface
+            device_fd = check_device(device)
+            if device_fd:
+                return device_fd
 
 if __name__ == "__main__":
     import sys
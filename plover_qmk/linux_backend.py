@@ -12,31 +12,13 @@ from time import sleep
 import pyudev
 import os
 import select
-import struct
 
-from .find_dev import wait_for_device
+from .find_dev import wait_for_device, COALESCE_WINDOW, COALESCE_MAX_WAIT
+from .protocol import STENO_KEY_CHART, parse_packet
 
 from plover import log
 from plover.machine.base import ThreadedStenotypeBase
 
-STENO_KEY_CHART = ("#1",  "#2", "#3", "#4", "#5", "#6", "#7", "#8", "#9", "#A", "#B", "#C",
-                   "X1", "S1-", "T-", "P-", "H-", "*1", "*3", "-F", "-P", "-L", "-T", "-D",
-                   "X2", "S2-", "K-", "W-", "R-", "*2", "*4", "-R", "-B", "-G", "-S", "-Z",
-                                 "X3", "A-", "O-",             "-E", "-U", "X4")
-
-packet_struct = struct.Struct("Ii")
-
-def parse_packet(packet):
-    usage, value = packet_struct.unpack(packet)
-
-    usage_page = usage >> 16
-    usage = usage & 0xFF
-
-    assert usage_page == 0x0a # TODO: this probably shouldn't be an assert (and we should check the usage range, too)
-    #to do: ask dnaq to fix this, this isn't spec conform
-    key_index = (7 -  usage % 8) + usage//8 * 8
-    return key_index, value
-
 # 0xFEED is for qmk
 VENDOR_IDS = [0xFEED]
 
@@ -88,6 +70,9 @@ class QMK(ThreadedStenotypeBase):
         super(QMK, self).__init__()
         self._machine = None
         self.finished_notify_recv = self.finished_notify_send = None
+        # how long to wait for udev event bursts to settle, see find_dev.coalesce_events
+        self._coalesce_window = params.get("coalesce_window", COALESCE_WINDOW)
+        self._coalesce_max_wait = params.get("coalesce_max_wait", COALESCE_MAX_WAIT)
 
     def _on_stroke(self, keys):
         steno_keys = self.keymap.keys_to_actions(keys)
@@ -97,7 +82,9 @@ class QMK(ThreadedStenotypeBase):
     def _connect(self):
         connected = False
         self._initializing()
-        device = wait_for_device(self.finished_notify_recv)
+        device = wait_for_device(self.finished_notify_recv,
+                                 window=self._coalesce_window,
+                                 max_wait=self._coalesce_max_wait)
 
         if device:
             self._machine = device
@@ -167,3 +154,10 @@ class QMK(ThreadedStenotypeBase):
             self._machine = None
 
         self._stopped()
+
+    @classmethod
+    def get_option_info(cls):
+        return {
+            "coalesce_window": (COALESCE_WINDOW, float),
+            "coalesce_max_wait": (COALESCE_MAX_WAIT, float),
+        }
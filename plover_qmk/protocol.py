@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+# See LICENSE.txt for details.
+
+"Key chart and packet format of dnaq's stenoHID protocol, as seen through hiddev."
+
+import struct
+
+STENO_KEY_CHART = ("#1",  "#2", "#3", "#4", "#5", "#6", "#7", "#8", "#9", "#A", "#B", "#C",
+                   "X1", "S1-", "T-", "P-", "H-", "*1", "*3", "-F", "-P", "-L", "-T", "-D",
+                   "X2", "S2-", "K-", "W-", "R-", "*2", "*4", "-R", "-B", "-G", "-S", "-Z",
+                                 "X3", "A-", "O-",             "-E", "-U", "X4")
+
+packet_struct = struct.Struct("Ii")
+
+def parse_packet(packet):
+    usage, value = packet_struct.unpack(packet)
+
+    usage_page = usage >> 16
+    usage = usage & 0xFF
+
+    assert usage_page == 0x0a # TODO: this probably shouldn't be an assert (and we should check the usage range, too)
+    #to do: ask dnaq to fix this, this isn't spec conform
+    key_index = (7 -  usage % 8) + usage//8 * 8
+    return key_index, value
@@ -0,0 +1,363 @@
+"""Virtual stenoHID device for testing, based on the kernel's /dev/uhid interface.
+
+This creates an HID device with the same vendor and product IDs (feed:1337) and
+the same application usage (0xff504c56) as a stenoHID keyboard, and lets you send
+random strokes through it at whatever rate you like:
+
+    python3 -m plover_qmk.uhid_device --rate 200 --count 10000
+    python3 -m plover_qmk.uhid_device --churn 100
+
+Note that uhid devices are not USB devices, so the kernel only gives them a hidraw
+node and not a hiddev one (hiddev is part of the usbhid driver). They never show up
+in the usbmisc subsystem, so wait_for_device and the linux backend can't see them.
+What we can measure with them is the kernel side of things: in the default mode,
+we read the reports back from the hidraw node, count how many of them were
+dropped along the way and check that the rest arrived intact and in order, and
+in --churn mode we create and destroy the device over
+and over, and measure how long it takes for its hidraw node to show up.
+
+If /dev/uhid doesn't exist or we're not allowed to open it, we just print a
+message and exit without an error, so this can be used from scripts that should
+skip cleanly on machines where uhid is not available.
+"""
+
+import glob
+import os
+import random
+import select
+import struct
+import sys
+import threading
+import time
+
+from collections import namedtuple
+
+from .protocol import STENO_KEY_CHART
+
+UHID_PATH = "/dev/uhid"
+
+# See <linux/uhid.h> for these
+UHID_DESTROY = 1
+UHID_CREATE2 = 11
+UHID_INPUT2 = 12
+
+UHID_DATA_MAX = 4096
+BUS_USB = 0x03
+
+VENDOR_ID = 0xfeed
+PRODUCT_ID = 0x1337
+
+# struct uhid_event is packed, and its size is the size of the largest union
+# member (uhid_create2_req) plus the 4 byte type field. The kernel is fine with
+# us always writing the whole thing.
+uhid_create2_req = struct.Struct("<I128s64s64sHHIIII{}s".format(UHID_DATA_MAX))
+uhid_input2_req = struct.Struct("<IH{}s".format(UHID_DATA_MAX))
+uhid_destroy_req = struct.Struct("<I")
+UHID_EVENT_SIZE = uhid_create2_req.size
+
+# 48 keys, since that's six bytes. This covers everything in STENO_KEY_CHART.
+NUM_KEYS = 48
+REPORT_LENGTH = NUM_KEYS // 8
+
+REPORT_DESCRIPTOR = bytes([
+    0x06, 0x50, 0xff,  # Usage Page (Vendor 0xff50)
+    0x0a, 0x56, 0x4c,  # Usage (0x4c56)
+    0xa1, 0x01,        # Collection (Application)
+    0x05, 0x0a,        #   Usage Page (Ordinal)
+    0x19, 0x00,        #   Usage Minimum (0)
+    0x29, NUM_KEYS - 1,  # Usage Maximum (47)
+    0x15, 0x00,        #   Logical Minimum (0)
+    0x25, 0x01,        #   Logical Maximum (1)
+    0x75, 0x01,        #   Report Size (1)
+    0x95, NUM_KEYS,    #   Report Count (48)
+    0x81, 0x02,        #   Input (Data, Variable, Absolute)
+    0xc0,              # End Collection
+])
+
+RunResult = namedtuple("RunResult", ["sent", "received", "in_order", "error"])
+ChurnResult = namedtuple("ChurnResult", ["cycles", "appear_times", "missing", "error"])
+
+def key_to_usage(key_index):
+    """Inverse of the key index calculation in protocol.parse_packet.
+    (It's actually its own inverse, but this makes it clearer what's going on.)
+    """
+    return (7 - key_index % 8) + key_index // 8 * 8
+
+def chord_to_report(key_indices):
+    """Builds an input report with all of the given keys pressed."""
+
+    report = bytearray(REPORT_LENGTH)
+    for key_index in key_indices:
+        usage = key_to_usage(key_index)
+        report[usage // 8] |= 1 << (usage % 8)
+
+    return bytes(report)
+
+def random_chord(rng=random):
+    """Returns a random, non-empty set of key indices from STENO_KEY_CHART."""
+
+    size = rng.randint(1, 6)
+    return set(rng.sample(range(len(STENO_KEY_CHART)), size))
+
+def _pad(data):
+    return data + bytes(UHID_EVENT_SIZE - len(data))
+
+_device_counter = 0
+
+class VirtualStenoHID(object):
+
+    def __init__(self, name="virtual stenoHID", path=UHID_PATH):
+        global _device_counter
+
+        self.name = name
+        self.path = path
+        self.fd = None
+
+        # we use the uniq field to find our own hidraw node again later
+        _device_counter += 1
+        self.uniq = "uhid-{}-{}".format(os.getpid(), _device_counter)
+
+    def create(self):
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CLOEXEC)
+
+        event = uhid_create2_req.pack(
+            UHID_CREATE2,
+            self.name.encode("utf-8"),
+            b"",
+            self.uniq.encode("utf-8"),
+            len(REPORT_DESCRIPTOR),
+            BUS_USB,
+            VENDOR_ID,
+            PRODUCT_ID,
+            0,
+            0,
+            REPORT_DESCRIPTOR,
+        )
+
+        try:
+            os.write(self.fd, event)
+        except OSError:
+            os.close(self.fd)
+            self.fd = None
+            raise
+
+    def destroy(self):
+        if self.fd is None:
+            return
+
+        try:
+            os.write(self.fd, _pad(uhid_destroy_req.pack(UHID_DESTROY)))
+        finally:
+            # closing the fd would destroy the device anyway
+            os.close(self.fd)
+            self.fd = None
+
+    def send_report(self, report):
+        os.write(self.fd, _pad(uhid_input2_req.pack(UHID_INPUT2, len(report), report)))
+
+    def send_stroke(self, key_indices):
+        """Presses all of the given keys at once, then releases them. Returns
+        the reports that were sent.
+        """
+        reports = [chord_to_report(key_indices), bytes(REPORT_LENGTH)]
+        for report in reports:
+            self.send_report(report)
+        return reports
+
+    def find_hidraw(self):
+        """Returns the path of this device's hidraw node, or None if it isn't there (yet)."""
+
+        for uevent_path in glob.glob("/sys/class/hidraw/hidraw*/device/uevent"):
+            try:
+                with open(uevent_path) as uevent:
+                    lines = uevent.read().splitlines()
+            # the device can disappear while we're looking at it
+            except OSError:
+                continue
+
+            if "HID_UNIQ={}".format(self.uniq) in lines:
+                node = uevent_path.split("/")[4]
+                return os.path.join("/dev", node)
+
+        return None
+
+    def wait_for_hidraw(self, timeout=5.0):
+        deadline = time.monotonic() + timeout
+
+        while time.monotonic() < deadline:
+            path = self.find_hidraw()
+            if path and os.path.exists(path):
+                return path
+            time.sleep(0.001)
+
+        return None
+
+    def __enter__(self):
+        self.create()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.destroy()
+
+class ReportReader(threading.Thread):
+    """Reads reports from a hidraw node in the background and keeps them."""
+
+    def __init__(self, path):
+        super(ReportReader, self).__init__()
+        self.daemon = True
+        self.reports = []
+        self._stop_requested = threading.Event()
+        self._fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK | os.O_CLOEXEC)
+
+    def run(self):
+        try:
+            while True:
+                ready, _, _ = select.select([self._fd], [], [], 0.1)
+
+                if not ready:
+                    # only stop once everything has been read
+                    if self._stop_requested.is_set():
+                        break
+                    continue
+
+                try:
+                    report = os.read(self._fd, REPORT_LENGTH)
+                except BlockingIOError:
+                    continue
+                except OSError:
+                    # the device went away
+                    break
+
+                self.reports.append(report)
+        finally:
+            os.close(self._fd)
+
+    def stop(self):
+        self._stop_requested.set()
+        self.join()
+
+def is_subsequence(needle, haystack):
+    """Checks if all of `needle` appears in `haystack`, in the same order, but
+    possibly with gaps in between.
+    """
+    remaining = iter(haystack)
+    return all(any(item == other for other in remaining) for item in needle)
+
+def uhid_available(path=UHID_PATH):
+    return os.access(path, os.R_OK | os.W_OK)
+
+def run(rate, count, seed=None, timeout=5.0):
+    """Sends `count` random strokes at `rate` strokes per second (or as fast as
+    possible if `rate` is 0), and reads them back from the hidraw node. Every
+    stroke is two reports (press and release), so without any drops, `received`
+    will be twice `sent`. `in_order` tells whether the received reports are the
+    sent ones, in the same order (drops aside).
+    """
+
+    rng = random.Random(seed)
+    sent = 0
+    sent_reports = []
+    error = None
+
+    with VirtualStenoHID() as device:
+        path = device.wait_for_hidraw(timeout)
+        if path is None:
+            return RunResult(sent=0, received=0, in_order=True, error="hidraw node did not appear")
+
+        # the hidraw node can be less accessible than /dev/uhid
+        try:
+            reader = ReportReader(path)
+        except OSError as e:
+            return RunResult(sent=0, received=0, in_order=True, error="could not open {}: {}".format(path, e))
+
+        reader.start()
+
+        interval = 1.0 / rate if rate > 0 else 0
+        next_stroke = time.monotonic()
+
+        try:
+            for _ in range(count):
+                if interval:
+                    delay = next_stroke - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    next_stroke += interval
+
+                sent_reports.extend(device.send_stroke(random_chord(rng)))
+                sent += 1
+        except OSError as e:
+            error = str(e)
+        finally:
+            reader.stop()
+
+    return RunResult(sent=sent,
+                     received=len(reader.reports),
+                     in_order=is_subsequence(reader.reports, sent_reports),
+                     error=error)
+
+def churn(cycles, timeout=5.0):
+    """Creates and destroys the device `cycles` times, and records how long it
+    took for the hidraw node to appear each time. Cycles where it didn't appear
+    within `timeout` seconds are counted in `missing`.
+    """
+
+    appear_times = []
+    missing = 0
+    completed = 0
+
+    try:
+        for _ in range(cycles):
+            device = VirtualStenoHID()
+            start = time.monotonic()
+            device.create()
+
+            try:
+                if device.wait_for_hidraw(timeout):
+                    appear_times.append(time.monotonic() - start)
+                else:
+                    missing += 1
+            finally:
+                device.destroy()
+
+            completed += 1
+    except OSError as e:
+        return ChurnResult(completed, appear_times, missing, str(e))
+
+    return ChurnResult(completed, appear_times, missing, None)
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Create a virtual stenoHID device and send random strokes through it.")
+    parser.add_argument("--rate", type=float, default=10, help="strokes per second, 0 means as fast as possible (default: 10)")
+    parser.add_argument("--count", type=int, default=100, help="number of strokes to send (default: 100)")
+    parser.add_argument("--seed", type=int, default=None, help="seed for the random chords")
+    parser.add_argument("--churn", type=int, metavar="CYCLES", default=0, help="create and destroy the device CYCLES times instead of sending strokes")
+    args = parser.parse_args()
+
+    if not uhid_available():
+        print("{} is not accessible, skipping.".format(UHID_PATH))
+        sys.exit(0)
+
+    if args.churn:
+        result = churn(args.churn)
+
+        print("{} cycles, hidraw node missing in {}".format(result.cycles, result.missing))
+        if result.appear_times:
+            times = sorted(result.appear_times)
+            print("time until hidraw node appeared: min {:.1f}ms, median {:.1f}ms, max {:.1f}ms".format(
+                times[0] * 1000, times[len(times) // 2] * 1000, times[-1] * 1000))
+    else:
+        start = time.monotonic()
+        result = run(args.rate, args.count, seed=args.seed)
+        elapsed = time.monotonic() - start
+
+        expected = 2 * result.sent
+        print("sent {} strokes ({} reports) in {:.2f}s, received {} reports, dropped {}".format(
+            result.sent, expected, elapsed, result.received, expected - result.received))
+        if not result.in_order:
+            print("received reports don't match the ones that were sent")
+
+    if result.error:
+        print("error: {}".format(result.error))
+        sys.exit(1)
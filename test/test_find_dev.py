@@ -0,0 +1,129 @@
+import os
+import sys
+import time
+import types
+import unittest
+
+# find_dev needs plover's log and opens a udev context at import time. none of
+# that is used by the coalescing code, so stand in for them if they're missing.
+try:
+    import plover.log
+except ImportError:
+    plover = types.ModuleType("plover")
+    plover.log = types.ModuleType("plover.log")
+    plover.log.debug = lambda *args, **kwargs: None
+    sys.modules["plover"] = plover
+    sys.modules["plover.log"] = plover.log
+
+try:
+    import pyudev
+except ImportError:
+    pyudev = types.ModuleType("pyudev")
+    pyudev.Context = lambda: None
+    sys.modules["pyudev"] = pyudev
+
+from plover_qmk.find_dev import coalesce, coalesce_events
+
+
+class FakeDevice(dict):
+
+    def __init__(self, action, device_path, subsystem="usbmisc"):
+        super(FakeDevice, self).__init__(SUBSYSTEM=subsystem)
+        self.action = action
+        self.device_path = device_path
+
+
+class FakeMonitor(object):
+    """Stands in for a pyudev.Monitor. It's readable through a pipe, with one
+    byte per queued event. If `endless` is set, it keeps producing events forever.
+    """
+
+    def __init__(self, devices=(), endless=False):
+        self._read_fd, self._write_fd = os.pipe()
+        self._devices = list(devices)
+        self._endless = endless
+
+        os.write(self._write_fd, b"x" * max(len(self._devices), 1 if endless else 0))
+
+    def fileno(self):
+        return self._read_fd
+
+    def poll(self, timeout=None):
+        if self._endless:
+            return FakeDevice("add", "/devices/storm")
+
+        os.read(self._read_fd, 1)
+        return self._devices.pop(0)
+
+    def close(self):
+        os.close(self._read_fd)
+        os.close(self._write_fd)
+
+
+class TestCoalesce(unittest.TestCase):
+
+    def test_add_then_remove_cancels(self):
+        events = [("add", "/a", "a"), ("remove", "/a", "a")]
+        self.assertEqual(coalesce(events), [])
+
+    def test_duplicate_add_is_deduplicated(self):
+        events = [("add", "/a", "a1"), ("add", "/b", "b"), ("add", "/a", "a2")]
+        self.assertEqual(coalesce(events), ["a2", "b"])
+
+    def test_remove_then_add_survives(self):
+        events = [("remove", "/a", "a1"), ("add", "/a", "a2")]
+        self.assertEqual(coalesce(events), ["a2"])
+
+    def test_readded_device_goes_to_the_end(self):
+        events = [("add", "/a", "a1"), ("add", "/b", "b"), ("remove", "/a", "a1"), ("add", "/a", "a2")]
+        self.assertEqual(coalesce(events), ["b", "a2"])
+
+    def test_other_actions_are_ignored(self):
+        events = [("add", "/a", "a"), ("change", "/a", "a"), ("bind", "/b", "b")]
+        self.assertEqual(coalesce(events), ["a"])
+
+
+class TestCoalesceEvents(unittest.TestCase):
+
+    def setUp(self):
+        self.finished_recv, self.finished_send = os.pipe()
+
+    def tearDown(self):
+        os.close(self.finished_recv)
+        os.close(self.finished_send)
+
+    def test_burst(self):
+        monitor = FakeMonitor([
+            FakeDevice("add", "/a"),
+            FakeDevice("add", "/b"),
+            FakeDevice("remove", "/a"),
+            FakeDevice("add", "/other", subsystem="input"),
+            FakeDevice("add", "/c"),
+            FakeDevice("add", "/b"),
+        ])
+        self.addCleanup(monitor.close)
+
+        devices = coalesce_events(monitor, self.finished_recv, window=0.01, max_wait=1.0)
+        self.assertEqual([device.device_path for device in devices], ["/b", "/c"])
+
+    def test_max_wait_cuts_storm_short(self):
+        monitor = FakeMonitor(endless=True)
+        self.addCleanup(monitor.close)
+
+        start = time.monotonic()
+        devices = coalesce_events(monitor, self.finished_recv, window=0.05, max_wait=0.2)
+        elapsed = time.monotonic() - start
+
+        self.assertLess(elapsed, 1.0)
+        self.assertEqual([device.device_path for device in devices], ["/devices/storm"])
+
+    def test_finished_notification_aborts(self):
+        monitor = FakeMonitor(endless=True)
+        self.addCleanup(monitor.close)
+        os.write(self.finished_send, b"0")
+
+        self.assertIsNone(coalesce_events(monitor, self.finished_recv, window=1.0, max_wait=5.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
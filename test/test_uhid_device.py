@@ -0,0 +1,77 @@
+import os
+import unittest
+
+from plover_qmk import uhid_device
+from plover_qmk.protocol import STENO_KEY_CHART, packet_struct, parse_packet
+from plover_qmk.uhid_device import (
+    REPORT_LENGTH,
+    UHID_EVENT_SIZE,
+    VirtualStenoHID,
+    chord_to_report,
+    is_subsequence,
+    key_to_usage,
+    uhid_available,
+    uhid_create2_req,
+    uhid_input2_req,
+)
+
+
+class TestReports(unittest.TestCase):
+
+    def test_usage_round_trips_through_parse_packet(self):
+        for key_index in range(len(STENO_KEY_CHART)):
+            packet = packet_struct.pack(0x0a << 16 | key_to_usage(key_index), 1)
+            self.assertEqual(parse_packet(packet), (key_index, 1))
+
+    def test_chord_to_report_sets_one_bit_per_key(self):
+        for key_index in range(len(STENO_KEY_CHART)):
+            report = chord_to_report({key_index})
+            usage = key_to_usage(key_index)
+
+            self.assertEqual(len(report), REPORT_LENGTH)
+            self.assertEqual(int.from_bytes(report, "little"), 1 << usage)
+
+    def test_chord_to_report_empty(self):
+        self.assertEqual(chord_to_report(set()), bytes(REPORT_LENGTH))
+
+    def test_is_subsequence(self):
+        self.assertTrue(is_subsequence([], [1, 2]))
+        self.assertTrue(is_subsequence([1, 3], [1, 2, 3]))
+        self.assertFalse(is_subsequence([3, 1], [1, 2, 3]))
+        self.assertFalse(is_subsequence([1, 1], [1, 2, 3]))
+
+    def test_event_sizes(self):
+        self.assertEqual(uhid_create2_req.size, 4376)
+        self.assertEqual(UHID_EVENT_SIZE, 4376)
+        self.assertLessEqual(uhid_input2_req.size, UHID_EVENT_SIZE)
+
+
+@unittest.skipUnless(uhid_available(), "/dev/uhid is not accessible")
+class TestVirtualDevice(unittest.TestCase):
+
+    def test_reports_are_received(self):
+        # /dev/uhid can be accessible while the hidraw nodes are root-only
+        with VirtualStenoHID() as device:
+            path = device.wait_for_hidraw()
+            self.assertIsNotNone(path)
+            if not os.access(path, os.R_OK):
+                self.skipTest("{} is not readable".format(path))
+
+        result = uhid_device.run(rate=500, count=20, seed=0)
+
+        self.assertIsNone(result.error)
+        self.assertEqual(result.sent, 20)
+        self.assertEqual(result.received, 2 * result.sent)
+        # with nothing dropped, this means they're exactly the reports we sent
+        self.assertTrue(result.in_order)
+
+    def test_churn(self):
+        result = uhid_device.churn(3)
+
+        self.assertIsNone(result.error)
+        self.assertEqual(result.cycles, 3)
+        self.assertEqual(result.missing, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()